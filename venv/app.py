@@ -0,0 +1,255 @@
+import csv
+import io
+import itertools
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from flask import Flask, render_template, redirect, url_for, send_file, jsonify, request, Response, stream_with_context, make_response
+import generate_pdf  # Ensure generate_pdf.py is in the same directory
+import metrics
+import report_jobs
+from history_store import HistoryStore
+from report_cache import ReportCache
+from snapshot import DataSnapshot
+
+app = Flask(__name__)
+
+report_cache = ReportCache(os.path.join(tempfile.gettempdir(), "nakivo_reports"), ttl=300, max_entries=20)
+history_store = HistoryStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), "nakivo_history.db"))
+report_job_manager = report_jobs.ReportJobManager(max_pending=8, render_workers=os.cpu_count() or 2, abandon_after=300)
+recent_report_timings = deque(maxlen=20)
+
+def load_backup_snapshot():
+    # Everything the pages show is computed here, once per refresh.
+    tenants_data = generate_pdf.collect_nakivo_data(history_store)
+    since = (time.time() - 24 * 3600) * 1000
+    return {
+        "tenants": tenants_data,
+        "summary": generate_pdf.summarize_tenants(tenants_data),
+        "failures": history_store.failed_runs(since)
+    }
+
+backup_snapshot = DataSnapshot(load_backup_snapshot, interval=300)
+
+def render_from_snapshot(template, **context):
+    # Pages only change when the snapshot does, so its version is the ETag.
+    snapshot = backup_snapshot.current()
+    if request.if_none_match.contains(snapshot.version):
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template(template, snapshot=snapshot, **context))
+    response.set_etag(snapshot.version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Define routes for each solution
+@app.route('/')
+def dashboard():
+    solutions = {
+        'backup': {'name': 'Backup Solution', 'details': 'Summary of backup solution metrics.', 'route': 'backup'},
+        'email': {'name': 'Email Solution', 'details': 'Summary of email solution metrics.', 'route': 'email'},
+        'iaas': {'name': 'IaaS Solution', 'details': 'Summary of IaaS solution metrics.', 'route': 'iaas'}
+    }
+    return render_from_snapshot('dashboard.html', solutions=solutions)
+
+# Route to navigate to Backup Solution page
+@app.route('/backup')
+def backup():
+    solution = {"name": "Backup Solution", "details": "Details about the backup solution."}
+    return render_from_snapshot('backup.html', solution=solution)
+
+# Route to navigate to Email Solution page
+@app.route('/email')
+def email():
+    solution = {"name": "Email Solution", "details": "Details about the email solution."}
+    return render_from_snapshot('email.html', solution=solution)
+
+# Route to navigate to IaaS Solution page
+@app.route('/iaas')
+def iaas():
+    solution = {"name": "IaaS Solution", "details": "Details about the IaaS solution."}
+    return render_from_snapshot('iaas.html', solution=solution)
+
+def build_backup_report(bucket, render=generate_pdf.render_report, set_phase=None, timings=None):
+    if timings is None:
+        timings = metrics.ReportTimings()
+    tenants_data = generate_pdf.collect_nakivo_data(history_store, timings)
+    etag = report_cache.digest(tenants_data)
+    # Data unchanged since an earlier bucket: serve that render again.
+    pdf_path = report_cache.reuse(bucket, etag)
+    if pdf_path is None:
+        if set_phase is not None:
+            set_phase(report_jobs.RENDERING)
+        pdf_path = report_cache.new_path()
+        try:
+            render(tenants_data, pdf_path, timings=timings)
+        except Exception:
+            report_cache.discard(pdf_path)
+            raise
+    timings.observe()
+    recent_report_timings.append({"finished_at": time.time(), "etag": etag, "stages": timings.as_dict()})
+    return pdf_path, etag
+
+def render_in_process_pool(tenants_data, pdf_path, timings=None):
+    # Tenant sections are rendered as shards across the pool, then merged here.
+    return generate_pdf.render_report(tenants_data, pdf_path, report_job_manager.render_pool(), timings)
+
+def run_backup_report_job(job):
+    bucket = report_cache.time_bucket()
+    return report_cache.get_or_create(
+        bucket, lambda: build_backup_report(bucket, render_in_process_pool, job.set_phase, job.timings))
+
+# Route to generate the Backup PDF report
+@app.route('/generate_backup_report')
+def generate_backup_report():
+    # Simultaneous requests within the same time bucket share one collection
+    # and one render; later ones are served from the cache.
+    bucket = report_cache.time_bucket()
+    timings = metrics.ReportTimings()
+    try:
+        pdf_path, etag = report_cache.get_or_create(bucket, lambda: build_backup_report(bucket, timings=timings))
+    except generate_pdf.TenantCollectionError as e:
+        # An incomplete tenant list is never rendered or cached.
+        return jsonify({"error": str(e)}), 502
+    response = send_file(pdf_path, as_attachment=True, download_name="nakivo_report.pdf",
+                         etag=etag, conditional=True, max_age=report_cache.ttl)
+    # Only the request that actually built the report has a breakdown.
+    if timings.stages:
+        response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+# Prometheus metrics for Nakivo RPCs and report generation stages
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# Stage breakdown of the most recently generated reports
+@app.route('/debug/report_timings')
+def report_timings():
+    return jsonify(list(recent_report_timings))
+
+EXPORT_CSV_COLUMNS = [
+    "tenant", "used_vms", "total_storage", "free_storage", "allocated_storage", "consumed_storage",
+    "job_name", "job_type", "vms", "state", "start_date", "finish_date",
+    "data_transferred", "data_transferred_uncompressed", "schedule_name", "retention_info"
+]
+
+def iter_export_data():
+    """Collected tenants for an export, with the first one already fetched.
+
+    Waiting for the first tenant before the response starts means a failing
+    first tenant page is answered with a 502 (TenantCollectionError is raised
+    here) rather than an empty export.
+    """
+    tenants = generate_pdf.iter_nakivo_data(
+        history_store,
+        tenants=request.args.getlist('tenant'),
+        job_types=request.args.getlist('job_type'),
+        states=request.args.getlist('state'))
+    first = next(tenants, None)
+    if first is None:
+        return iter(())
+    return itertools.chain([first], tenants)
+
+# Streaming exports of the collected data; each tenant is written out as
+# soon as it has been collected. Once the response has started, a failed
+# tenant page can no longer change the status, so it ends the export with an
+# explicit error entry instead of silently leaving the rest out.
+@app.route('/backup/export.json')
+def export_backup_json():
+    try:
+        tenants = iter_export_data()
+    except generate_pdf.TenantCollectionError as e:
+        return jsonify({"error": str(e)}), 502
+
+    def generate():
+        yield '['
+        index = 0
+        try:
+            for index, tenant in enumerate(tenants, 1):
+                yield (',' if index > 1 else '') + json.dumps(tenant)
+        except generate_pdf.TenantCollectionError as e:
+            yield (',' if index else '') + json.dumps({"error": f"Export incomplete: {e}"})
+        yield ']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.route('/backup/export.csv')
+def export_backup_csv():
+    job_filtered = bool(request.args.getlist('job_type') or request.args.getlist('state'))
+    try:
+        tenants = iter_export_data()
+    except generate_pdf.TenantCollectionError as e:
+        return jsonify({"error": str(e)}), 502
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_CSV_COLUMNS)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        try:
+            for tenant in tenants:
+                storage = tenant['storage'] or {}
+                tenant_row = [tenant['name'], tenant['usedVms'], storage.get('totalStorage'),
+                              storage.get('freeStorage'), storage.get('allocatedStorage'),
+                              storage.get('consumedStorage')]
+                if not tenant['jobs'] and not job_filtered:
+                    writer.writerow(tenant_row)
+                for job in tenant['jobs']:
+                    latest_run = job.get('latestRun') or {}
+                    writer.writerow(tenant_row + [
+                        job['name'], job['jobType'], ";".join(job.get('vms', [])), latest_run.get('state'),
+                        latest_run.get('startDate'), latest_run.get('finishDate'), latest_run.get('dataTransferred'),
+                        latest_run.get('dataTransferredUncompressed'), latest_run.get('scheduleName'),
+                        job.get('retentionInfo')
+                    ])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        except generate_pdf.TenantCollectionError as e:
+            writer.writerow(["#ERROR", f"Export incomplete: {e}"])
+            yield buffer.getvalue()
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=nakivo_backup.csv'})
+
+# Asynchronous report jobs: enqueue, poll for progress, then download
+@app.route('/backup_reports', methods=['POST'])
+def create_backup_report_job():
+    try:
+        job = report_job_manager.submit('nakivo_backup_report', run_backup_report_job)
+    except report_jobs.QueueFull:
+        return jsonify({"error": "Too many report jobs pending, try again later."}), 503, {'Retry-After': '30'}
+    return jsonify(backup_report_job_body(job)), 202
+
+@app.route('/backup_reports/<job_id>')
+def backup_report_job_status(job_id):
+    job = report_job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown report job."}), 404
+    return jsonify(backup_report_job_body(job))
+
+@app.route('/backup_reports/<job_id>/download')
+def download_backup_report_job(job_id):
+    job = report_job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown report job."}), 404
+    if job.state != report_jobs.DONE:
+        return jsonify(backup_report_job_body(job)), 409
+    # The file belongs to the report cache and may have been evicted since
+    # the job finished.
+    if not os.path.exists(job.pdf_path):
+        return jsonify({"error": "Report has expired, please generate it again."}), 410
+    return send_file(job.pdf_path, as_attachment=True, download_name="nakivo_report.pdf",
+                     etag=job.etag, conditional=True)
+
+def backup_report_job_body(job):
+    body = job.to_dict()
+    body["status_url"] = url_for('backup_report_job_status', job_id=job.id)
+    body["download_url"] = url_for('download_backup_report_job', job_id=job.id)
+    return body
+
+if __name__ == '__main__':
+    app.run(debug=True)
@@ -0,0 +1,132 @@
+"""Benchmark report collection and rendering against the fake Nakivo router.
+
+Every tenant count is measured in a fresh subprocess so peak RSS is per run.
+One JSON object per measurement is printed and, with --output, appended to a
+JSON Lines file so results can be compared between runs. A measurement that
+fails is recorded with its error and stderr, and the remaining sizes still run:
+
+    python bench/benchmark.py --sizes 10 100 1000 --output bench_results.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import generate_pdf  # noqa: E402
+from fake_nakivo import FakeNakivo, start_server  # noqa: E402
+
+
+def measure(args):
+    pdf_generator = generate_pdf.NakivoPDFGenerator("127.0.0.1", "bench", "bench", max_workers=args.workers,
+                                                    port=args.port, scheme="http")
+    started = time.perf_counter()
+    pdf_generator.authenticate()
+    tenants_data = [
+        {"name": tenant['name'], "jobs": tenant['jobs'], "usedVms": tenant['usedVms'], "storage": tenant['storage']}
+        for tenant in pdf_generator.iter_tenant_info(page_size=args.page_size)
+    ]
+    collect_seconds = time.perf_counter() - started
+
+    executor = None
+    if args.render_workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.render_workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+    with tempfile.TemporaryDirectory() as output_dir:
+        started = time.perf_counter()
+        pdf_path = generate_pdf.render_report(tenants_data, os.path.join(output_dir, "report.pdf"), executor)
+        render_seconds = time.perf_counter() - started
+        pdf_bytes = os.path.getsize(pdf_path)
+    if executor is not None:
+        executor.shutdown()
+
+    return {
+        "tenants": args.tenants,
+        "collected_tenants": len(tenants_data),
+        "collect_seconds": round(collect_seconds, 4),
+        "render_seconds": round(render_seconds, 4),
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_child_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        "pdf_bytes": pdf_bytes,
+    }
+
+
+def run_size(args, tenants):
+    nakivo = FakeNakivo(tenants=tenants, jobs=args.jobs, latency=args.latency,
+                        error_rate=args.error_rate, page_error_rate=args.page_error_rate, seed=args.seed)
+    server = start_server(nakivo)
+    try:
+        command = [
+            sys.executable, os.path.abspath(__file__), "--measure",
+            "--port", str(server.server_port), "--tenants", str(tenants),
+            "--workers", str(args.workers), "--render-workers", str(args.render_workers),
+            "--page-size", str(args.page_size),
+        ]
+        completed = subprocess.run(command, capture_output=True, text=True)
+    finally:
+        server.shutdown()
+        server.server_close()
+    if completed.returncode != 0:
+        return {"tenants": tenants, "error": f"measurement exited with status {completed.returncode}",
+                "stderr": completed.stderr[-4000:]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="tenant counts to measure")
+    parser.add_argument("--jobs", type=int, default=5, help="jobs per tenant")
+    parser.add_argument("--latency", type=float, default=0.005, help="fake server latency per request (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake server error rate per tenant request")
+    parser.add_argument("--page-error-rate", type=float, default=0.0,
+                        help="fake server error rate for login and tenant list pages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=8, help="collector worker threads")
+    parser.add_argument("--render-workers", type=int, default=1, help="render processes (1 renders in-process)")
+    parser.add_argument("--page-size", type=int, default=generate_pdf.DEFAULT_PAGE_SIZE)
+    parser.add_argument("--output", help="append results to this JSON Lines file")
+    # Internal: measure one size against an already running server.
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--tenants", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        # Collection failures are printed by the collector; keep stdout for the result.
+        sys.stdout = sys.stderr
+        result = measure(args)
+        sys.stdout = sys.__stdout__
+        print(json.dumps(result))
+        return
+
+    run_info = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "jobs": args.jobs,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "page_error_rate": args.page_error_rate,
+        "workers": args.workers,
+        "render_workers": args.render_workers,
+        "page_size": args.page_size,
+    }
+    for tenants in args.sizes:
+        result = dict(run_info, **run_size(args, tenants))
+        print(json.dumps(result), flush=True)
+        if args.output:
+            with open(args.output, "a") as output:
+                output.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
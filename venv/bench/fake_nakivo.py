@@ -0,0 +1,177 @@
+"""Local stand-in for the Nakivo Ext Direct router (/c/router).
+
+Serves the four RPCs the report collector uses, for a configurable number of
+tenants and jobs, with an artificial per-request latency and error rate. The
+error rate applies to the per-tenant routers; login and tenant list pages
+have their own (default zero), since a failed page aborts the collection:
+
+    python bench/fake_nakivo.py --tenants 100 --jobs 10 --latency 0.02 --port 8443
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JOB_TYPES = ['BACKUP', 'BACKUP_COPY', 'REPLICATION']
+STATES = ['SUCCEEDED', 'SUCCEEDED', 'SUCCEEDED', 'FAILED']
+
+TENANT_ROUTER = re.compile(r"^/t/(?P<tenant_id>[^/]+)/c/router$")
+
+
+class FakeNakivo:
+    def __init__(self, tenants=10, jobs=5, vms_per_job=2, runs_per_vm=3, latency=0.0, error_rate=0.0,
+                 page_error_rate=0.0, seed=0):
+        self.tenants = tenants
+        self.jobs = jobs
+        self.vms_per_job = vms_per_job
+        self.runs_per_vm = runs_per_vm
+        self.latency = latency
+        self.error_rate = error_rate
+        self.page_error_rate = page_error_rate
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def should_fail(self, tenant_id):
+        rate = self.page_error_rate if tenant_id is None else self.error_rate
+        with self._random_lock:
+            return self._random.random() < rate
+
+    def handle(self, tenant_id, call):
+        action, method = call.get('action'), call.get('method')
+        handler = getattr(self, f"_{action}_{method}", None)
+        if handler is None:
+            return {"type": "exception", "tid": call.get('tid'), "message": f"Unknown method {action}.{method}"}
+        return {"type": "rpc", "tid": call.get('tid'), "action": action, "method": method,
+                "data": handler(tenant_id, *call.get('data') or [])}
+
+    def _AuthenticationManagement_login(self, tenant_id, username, password, remember=False):
+        return {"username": username}
+
+    def _MultitenancyManagement_getTenants(self, tenant_id, options):
+        start = options['filter']['start']
+        count = options['filter']['count']
+        return {
+            "totalCount": self.tenants,
+            "children": [
+                {"uuid": f"tenant-{index:05d}", "name": f"Tenant {index}", "usedVms": self.jobs * self.vms_per_job}
+                for index in range(start, min(start + count, self.tenants))
+            ]
+        }
+
+    def _JobSummaryManagement_getProcessedVms(self, tenant_id, options):
+        rng = random.Random(f"{self.seed}:{tenant_id}")
+        now_ms = int(time.time() * 1000)
+        period_ms = options.get('periodMinutes', 1440) * 60 * 1000
+        job_info_list = []
+        for job_index in range(self.jobs):
+            vm_info_list = []
+            for vm_index in range(self.vms_per_job):
+                run_info_list = []
+                for run_index in range(self.runs_per_vm):
+                    start_date = now_ms - rng.randint(0, period_ms)
+                    run_info_list.append({
+                        "state": rng.choice(STATES),
+                        "startDate": start_date,
+                        "finishDate": start_date + rng.randint(60000, 3600000),
+                        "dataTransferred": rng.randint(0, 10 ** 10),
+                        "dataTransferredUncompressed": rng.randint(0, 2 * 10 ** 10),
+                        "scheduleName": "Daily",
+                        "retentionInfo": "14 recovery points"
+                    })
+                run_info_list.sort(key=lambda run: run['startDate'])
+                vm_info_list.append({"name": f"vm-{job_index}-{vm_index}", "runInfoList": run_info_list})
+            job_info_list.append({
+                "name": f"Job {job_index}",
+                "jobType": JOB_TYPES[job_index % len(JOB_TYPES)],
+                "vmInfoList": vm_info_list
+            })
+        return {"jobInfoList": job_info_list}
+
+    def _BackupManagement_getBackupRepository(self, tenant_id, repository_id):
+        rng = random.Random(f"{self.seed}:{tenant_id}:storage")
+        size = 10 ** 13
+        consumed = rng.randint(0, size)
+        return {"size": size, "free": size - consumed, "allocated": consumed, "consumed": consumed}
+
+
+def make_handler(nakivo):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            if self.path == "/c/router":
+                tenant_id = None
+            else:
+                match = TENANT_ROUTER.match(self.path)
+                if match is None:
+                    return self._send(404, {"error": "not found"})
+                tenant_id = match.group('tenant_id')
+
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b"null")
+            if nakivo.latency:
+                time.sleep(nakivo.latency)
+            if nakivo.should_fail(tenant_id):
+                return self._send(500, {"error": "injected failure"})
+
+            # A list is an Ext Direct batch: one response per call, by tid.
+            if isinstance(payload, list):
+                body = [nakivo.handle(tenant_id, call) for call in payload]
+            else:
+                body = nakivo.handle(tenant_id, payload)
+            self._send(200, body)
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Set-Cookie", "JSESSIONID=fake-session; Path=/")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(nakivo, host="127.0.0.1", port=0):
+    """Serve ``nakivo`` on a background thread; returns the server (see ``server_port``)."""
+    server = ThreadingHTTPServer((host, port), make_handler(nakivo))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--jobs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of per-tenant requests answered with HTTP 500")
+    parser.add_argument("--page-error-rate", type=float, default=0.0,
+                        help="fraction of login and tenant list requests answered with HTTP 500")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    nakivo = FakeNakivo(tenants=args.tenants, jobs=args.jobs, latency=args.latency,
+                        error_rate=args.error_rate, page_error_rate=args.page_error_rate, seed=args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(nakivo))
+    print(f"Fake Nakivo listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
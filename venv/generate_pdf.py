@@ -0,0 +1,523 @@
+import os
+import requests
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pypdf import PdfWriter
+from requests.adapters import HTTPAdapter
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Spacer, Paragraph
+from reportlab.lib.units import inch
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib import colors
+import urllib3
+import metrics
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PENDING_SHARDS = 16
+TENANTS_PER_SHARD = 25
+
+class TenantCollectionError(Exception):
+    """The tenant list could not be read completely from the router."""
+
+JOB_TYPES = ['BACKUP', 'BACKUP_COPY', 'REPLICATION']
+
+# Styles are shared by every tenant section rather than rebuilt per tenant.
+STYLES = getSampleStyleSheet()
+STYLES['Title'].fontSize = 24
+STYLES['Title'].textColor = colors.darkblue
+STYLES['Normal'].fontSize = 12
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTSIZE', (0, 0), (-1, -1), 12),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+])
+
+DETAILS_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTSIZE', (0, 0), (-1, -1), 12),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+])
+
+class NakivoPDFGenerator:
+    def __init__(self, server_address, username, password, max_workers=8, store=None,
+                 port=4443, scheme="https"):
+        self.server_address = server_address
+        self.base_url = f"{scheme}://{server_address}:{port}"
+        self.username = username
+        self.password = password
+        self.cookies = None
+        self.max_workers = max_workers
+        self.store = store
+
+        # One keep-alive session shared by every worker thread, with a pool
+        # large enough that each worker can hold its own connection.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(max_workers * 2, 10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def run_request(self, url, data):
+        headers = {'Content-Type': 'application/json'}
+        started = time.perf_counter()
+        try:
+            response = self.session.post(url, json=data, headers=headers, cookies=self.cookies, verify=False)
+            response.raise_for_status()
+            result = response.json()
+            self._record_rpc(data, started, result)
+            return result, response.cookies
+        except requests.exceptions.RequestException as e:
+            self._record_rpc(data, started, None)
+            print(f"Error making request to {url}: {e}")
+            return None, None
+
+    def _record_rpc(self, data, started, result):
+        # Every call of a batch is recorded under its own action and method,
+        # with the latency of the POST that carried it.
+        elapsed = time.perf_counter() - started
+        calls = data if isinstance(data, list) else [data]
+        answers = {}
+        if isinstance(result, list):
+            answers = {answer.get('tid'): answer for answer in result if isinstance(answer, dict)}
+        elif isinstance(result, dict):
+            answers = {calls[0].get('tid'): result}
+        for call in calls:
+            labels = {"action": call.get('action'), "method": call.get('method')}
+            metrics.RPC_REQUESTS.inc(**labels)
+            metrics.RPC_DURATION.observe(elapsed, **labels)
+            answer = answers.get(call.get('tid'))
+            if answer is None or answer.get('type') == 'exception':
+                metrics.RPC_ERRORS.inc(**labels)
+
+    def authenticate(self):
+        url = f"{self.base_url}/c/router"
+        auth_data = {
+            "action": "AuthenticationManagement",
+            "method": "login",
+            "data": [self.username, self.password, False],
+            "type": "rpc",
+            "tid": 1
+        }
+        response, self.cookies = self.run_request(url, auth_data)
+        if response is None:
+            print("Authentication failed.")
+        return self.cookies
+
+    def fetch_tenant_page(self, start, count):
+        url = f"{self.base_url}/c/router"
+        tenant_data = {
+            "action": "MultitenancyManagement",
+            "method": "getTenants",
+            "data": [{"filter": {"start": start, "count": count, "criteria": []}}],
+            "type": "rpc",
+            "tid": 1
+        }
+        response, _ = self.run_request(url, tenant_data)
+        if response is None or 'data' not in response or 'children' not in response['data']:
+            print("No response received or unexpected response structure:", response)
+            return None
+        return response['data']['children'], response['data'].get('totalCount')
+
+    def iter_tenants(self, page_size=DEFAULT_PAGE_SIZE):
+        # The next page is requested in the background while the caller is
+        # still working through the current one. Paging runs until the
+        # router's totalCount is reached, so a server that caps the page size
+        # below page_size still yields every tenant.
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            start = 0
+            next_page = prefetcher.submit(self.fetch_tenant_page, start, page_size)
+            while next_page is not None:
+                result = next_page.result()
+                if result is None:
+                    raise TenantCollectionError(f"Failed to fetch tenants starting at {start}")
+                page, total_count = result
+                if not page:
+                    if total_count is not None and start < total_count:
+                        raise TenantCollectionError(
+                            f"Tenant page at {start} was empty, expected {total_count} tenants")
+                    return
+                start += len(page)
+                next_page = None
+                if total_count is not None:
+                    more = start < total_count
+                else:
+                    more = len(page) >= page_size
+                if more:
+                    next_page = prefetcher.submit(self.fetch_tenant_page, start, page_size)
+                yield from page
+
+    def iter_tenant_info(self, page_size=DEFAULT_PAGE_SIZE, tenant_filter=None):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # At most two tenants per worker are in flight; results are
+            # yielded in tenant order as soon as they are ready.
+            pending = deque()
+            for tenant in self.iter_tenants(page_size):
+                if tenant_filter is not None and not tenant_filter(tenant):
+                    continue
+                pending.append((tenant, executor.submit(self.fetch_tenant_details, tenant['uuid'])))
+                if len(pending) >= self.max_workers * 2:
+                    yield self._tenant_info(*pending.popleft())
+            while pending:
+                yield self._tenant_info(*pending.popleft())
+
+    def fetch_tenants(self, page_size=DEFAULT_PAGE_SIZE):
+        return list(self.iter_tenant_info(page_size))
+
+    def _tenant_info(self, tenant, details_future):
+        jobs, storage_info = details_future.result()
+        if self.store is not None:
+            self.store.record_tenant(tenant)
+        return {
+            "id": tenant['uuid'],
+            "name": tenant['name'],
+            "usedVms": tenant['usedVms'],
+            "jobs": jobs,
+            "storage": storage_info
+        }
+
+    def fetch_tenant_details(self, tenant_id):
+        # Both lookups go to the Ext Direct router as a single batched POST;
+        # the responses are matched back to their calls by tid.
+        url = f"{self.base_url}/t/{tenant_id}/c/router"
+        period_minutes = self._job_period_minutes(tenant_id)
+        batch = [self._job_details_request(period_minutes, tid=1), self._storage_request(tid=2)]
+        requested_at = time.time()
+        response, _ = self.run_request(url, batch)
+        results = {}
+        if isinstance(response, list):
+            results = {item.get('tid'): item for item in response if isinstance(item, dict)}
+        jobs = self._parse_job_details(tenant_id, results.get(1), requested_at, period_minutes)
+        storage_info = self._parse_storage_consumption(tenant_id, results.get(2))
+        return jobs, storage_info
+
+    def fetch_job_details(self, tenant_id):
+        url = f"{self.base_url}/t/{tenant_id}/c/router"
+        period_minutes = self._job_period_minutes(tenant_id)
+        requested_at = time.time()
+        response, _ = self.run_request(url, self._job_details_request(period_minutes))
+        return self._parse_job_details(tenant_id, response, requested_at, period_minutes)
+
+    def fetch_storage_consumption(self, tenant_id):
+        url = f"{self.base_url}/t/{tenant_id}/c/router"
+        response, _ = self.run_request(url, self._storage_request())
+        return self._parse_storage_consumption(tenant_id, response)
+
+    def _job_period_minutes(self, tenant_id):
+        # With a history store only runs since the tenant's last sync are
+        # requested; everything older is already stored locally.
+        if self.store is not None:
+            return self.store.sync_period_minutes(tenant_id)
+        return 1440
+
+    def _job_details_request(self, period_minutes, tid=1):
+        return {
+            "action": "JobSummaryManagement",
+            "method": "getProcessedVms",
+            "data": [{"periodMinutes": period_minutes}],
+            "type": "rpc",
+            "tid": tid
+        }
+
+    def _storage_request(self, tid=1):
+        return {
+            "action": "BackupManagement",
+            "method": "getBackupRepository",
+            "data": [1],
+            "type": "rpc",
+            "tid": tid
+        }
+
+    def _parse_job_details(self, tenant_id, response, requested_at=None, period_minutes=1440):
+        if response is None or 'data' not in response or 'jobInfoList' not in response['data']:
+            print(f"Failed to fetch job details for tenant {tenant_id}")
+            return []
+
+        job_info_list = response['data']['jobInfoList']
+        if self.store is not None:
+            self.store.record_jobs(tenant_id, job_info_list, requested_at or time.time(), period_minutes)
+            return self.store.latest_jobs(tenant_id)
+
+        jobs = []
+        for job_info in job_info_list:
+            job = {
+                "name": job_info['name'],
+                "jobType": job_info['jobType'],
+                "latestRun": None,
+                "retentionInfo": "N/A",
+                "vms": [vm['name'] for vm in job_info['vmInfoList']]
+            }
+            if job_info['vmInfoList']:
+                vm_info = job_info['vmInfoList'][0]
+                run_info_list = vm_info.get('runInfoList', [])
+                if run_info_list:
+                    latest_run = run_info_list[-1]
+                    job["latestRun"] = {
+                        "state": latest_run['state'],
+                        "startDate": latest_run['startDate'],
+                        "finishDate": latest_run['finishDate'],
+                        "dataTransferred": latest_run['dataTransferred'],
+                        "dataTransferredUncompressed": latest_run['dataTransferredUncompressed'],
+                        "scheduleName": latest_run['scheduleName']
+                    }
+                    job["retentionInfo"] = latest_run.get('retentionInfo', 'N/A')
+
+            jobs.append(job)
+        return jobs
+
+    def _parse_storage_consumption(self, tenant_id, response):
+        if response and 'data' in response:
+            storage_info = {
+                "totalStorage": response['data']['size'],
+                "freeStorage": response['data']['free'],
+                "allocatedStorage": response['data']['allocated'],
+                "consumedStorage": response['data']['consumed']
+            }
+            return storage_info
+        else:
+            print(f"Failed to fetch storage consumption for tenant {tenant_id}")
+            return None
+
+    @staticmethod
+    def generate_pdf(tenants_data, pdf_path=None, executor=None, timings=None):
+        if timings is None:
+            timings = metrics.ReportTimings()
+        if pdf_path is None:
+            # Every render gets its own file so concurrent reports never
+            # overwrite each other.
+            fd, pdf_path = tempfile.mkstemp(prefix="nakivo_report_", suffix=".pdf")
+            os.close(fd)
+        report_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # Runs of TENANTS_PER_SHARD tenant sections are built as separate PDF
+        # shards, in ``executor`` when one is given, and then merged in tenant
+        # order. Sections flow on continuously inside a shard, so only shard
+        # boundaries start a new page. Only a bounded number of shards is in
+        # flight at any time. The shards' own stage times are summed as worker
+        # time; the wall-clock time of building them all is the
+        # "render_shards" stage.
+        with tempfile.TemporaryDirectory(prefix="nakivo_shards_") as shard_dir:
+            shard_paths = []
+            pending = deque()
+
+            def finish(shard):
+                shard_path, shard_timings = shard
+                for name, seconds in shard_timings.items():
+                    timings.add_worker(name, seconds)
+                shard_paths.append(shard_path)
+
+            with timings.stage("render_shards"):
+                for index, start in enumerate(range(0, max(len(tenants_data), 1), TENANTS_PER_SHARD)):
+                    shard_tenants = tenants_data[start:start + TENANTS_PER_SHARD]
+                    shard_path = os.path.join(shard_dir, f"{index:06d}.pdf")
+                    header = report_datetime if index == 0 else None
+                    if executor is None:
+                        finish(render_shard(shard_tenants, shard_path, header))
+                        continue
+                    pending.append(executor.submit(render_shard, shard_tenants, shard_path, header))
+                    if len(pending) >= MAX_PENDING_SHARDS:
+                        finish(pending.popleft().result())
+                while pending:
+                    finish(pending.popleft().result())
+
+            with timings.stage("merge"):
+                writer = PdfWriter()
+                for shard_path in shard_paths:
+                    writer.append(shard_path)
+                with open(pdf_path, "wb") as output:
+                    writer.write(output)
+        return pdf_path
+
+    @staticmethod
+    def create_header(report_datetime):
+        title = Paragraph("Nakivo Backup Daily Report", STYLES['Title'])
+        date_time_text = Paragraph(f"Report generated on: {report_datetime}", STYLES['Normal'])
+        return [title, Spacer(1, 0.1 * inch), date_time_text, Spacer(1, 0.2 * inch)]
+
+    @staticmethod
+    def create_tenant_section(tenant):
+        jobs_by_type = group_jobs_by_type(tenant['jobs'])
+        elements = [
+            Paragraph(f"Tenant Name: {tenant['name']}", STYLES['Heading1']),
+            Spacer(1, 0.2 * inch),
+            NakivoPDFGenerator.create_summary_matrix(tenant, jobs_by_type),
+            Spacer(1, 0.2 * inch),
+            NakivoPDFGenerator.create_tenant_table(tenant),
+            Spacer(1, 0.3 * inch)
+        ]
+        elements.extend(NakivoPDFGenerator.create_jobs_table(tenant, jobs_by_type))
+        elements.append(Spacer(1, 0.5 * inch))
+        return elements
+
+    @staticmethod
+    def create_summary_matrix(tenant, jobs_by_type=None):
+        if jobs_by_type is None:
+            jobs_by_type = group_jobs_by_type(tenant['jobs'])
+
+        data = [
+            ["Job Type", "Total", "Failed", "Successful"]
+        ]
+        for job_type in JOB_TYPES:
+            counts = summarize_jobs(jobs_by_type[job_type])
+            data.append([job_type, counts['total'], counts['failed'], counts['successful']])
+
+        matrix_table = Table(data, style=SUMMARY_TABLE_STYLE)
+        return matrix_table
+
+    @staticmethod
+    def create_tenant_table(tenant):
+        # Storage is None when its lookup failed during collection.
+        storage = tenant['storage'] or {}
+        consumed_storage = storage.get('consumedStorage', 'N/A')
+        total_storage = storage.get('totalStorage', 'N/A')
+
+        data = [
+            ["Number of Reserved Workloads:", tenant['usedVms']],
+            ["Number of Licenses Used:", tenant['usedVms']],
+            ["Total Storage Consumption:", f"{consumed_storage} bytes"]
+        ]
+
+        table = Table(data, style=DETAILS_TABLE_STYLE)
+        return table
+
+    @staticmethod
+    def create_jobs_table(tenant, jobs_by_type=None):
+        if jobs_by_type is None:
+            jobs_by_type = group_jobs_by_type(tenant.get('jobs', []))
+        elements = []
+
+        for job_type in JOB_TYPES:
+            job_section_title = Paragraph(f"Job Type: {job_type}", STYLES['Heading2'])
+            elements.append(job_section_title)
+            elements.append(Spacer(1, 0.1 * inch))
+
+            for job in jobs_by_type[job_type]:
+                latest_run = job.get('latestRun')
+                retention_info = job.get('retentionInfo', 'N/A')
+
+                if latest_run:
+                    vm_names = ", ".join(job.get('vms', []))
+                    data = [
+                        ['Job Name:', job['name']],
+                        ['VMs:', vm_names],
+                        ['Last Execution Date:', latest_run['finishDate']],
+                        ['State:', latest_run['state']],
+                        ['Data Transferred:', f"{latest_run['dataTransferred']} bytes"],
+                        ['Data Transferred (Uncompressed):', f"{latest_run['dataTransferredUncompressed']} bytes"],
+                        ['Scheduler Name:', latest_run['scheduleName']],
+                        ['Execution per Schedule:', 'YES' if latest_run['state'] == "SUCCEEDED" else 'NO'],
+                        ['Retention Policy Details:', retention_info]
+                    ]
+                    elements.append(Table(data, style=DETAILS_TABLE_STYLE))
+                    elements.append(Spacer(1, 0.2 * inch))
+                else:
+                    elements.append(Table([['No job details available']], style=DETAILS_TABLE_STYLE))
+                    elements.append(Spacer(1, 0.2 * inch))
+
+        return elements
+
+def group_jobs_by_type(jobs):
+    jobs_by_type = {job_type: [] for job_type in JOB_TYPES}
+    for job in jobs:
+        if job['jobType'] in jobs_by_type:
+            jobs_by_type[job['jobType']].append(job)
+    return jobs_by_type
+
+def summarize_jobs(jobs):
+    counts = {"total": 0, "failed": 0, "successful": 0}
+    for job in jobs:
+        state = (job.get('latestRun') or {}).get('state')
+        counts['total'] += 1
+        if state == 'FAILED':
+            counts['failed'] += 1
+        elif state == 'SUCCEEDED':
+            counts['successful'] += 1
+    return counts
+
+def summarize_tenants(tenants_data):
+    totals = {job_type: {"total": 0, "failed": 0, "successful": 0} for job_type in JOB_TYPES}
+    tenants = []
+    for tenant in tenants_data:
+        jobs_by_type = group_jobs_by_type(tenant['jobs'])
+        counts_by_type = {job_type: summarize_jobs(jobs_by_type[job_type]) for job_type in JOB_TYPES}
+        for job_type, counts in counts_by_type.items():
+            for name, value in counts.items():
+                totals[job_type][name] += value
+        tenants.append({
+            "name": tenant['name'],
+            "usedVms": tenant['usedVms'],
+            "consumedStorage": (tenant['storage'] or {}).get('consumedStorage'),
+            "jobs": counts_by_type
+        })
+    return {"tenants": tenants, "totals": totals}
+
+def render_shard(tenants, shard_path, report_datetime=None):
+    # Shards may run in another process, so stage times are handed back to
+    # the caller along with the shard path.
+    timings = metrics.ReportTimings()
+    with timings.stage("build_flowables"):
+        elements = []
+        if report_datetime is not None:
+            elements.extend(NakivoPDFGenerator.create_header(report_datetime))
+        for tenant in tenants:
+            elements.extend(NakivoPDFGenerator.create_tenant_section(tenant))
+    with timings.stage("doc_build"):
+        SimpleDocTemplate(shard_path, pagesize=letter).build(elements)
+    return shard_path, timings.stages
+
+def iter_nakivo_data(store=None, tenants=None, job_types=None, states=None, timings=None):
+    if timings is None:
+        timings = metrics.ReportTimings()
+    server_address = "172.20.240.1"
+    username = "louay"
+    password = "louay"
+
+    pdf_generator = NakivoPDFGenerator(server_address, username, password, store=store)
+    with timings.stage("authenticate"):
+        pdf_generator.authenticate()
+
+    # Tenants are filtered before any of their RPCs are sent; jobs as each
+    # tenant comes back.
+    tenant_filter = None
+    if tenants:
+        tenant_filter = lambda tenant: tenant['name'] in tenants or tenant['uuid'] in tenants
+
+    # Only the time spent waiting on collection counts towards "collect",
+    # not the time the caller spends on each yielded tenant.
+    tenant_info = pdf_generator.iter_tenant_info(tenant_filter=tenant_filter)
+    while True:
+        with timings.stage("collect"):
+            tenant = next(tenant_info, None)
+        if tenant is None:
+            return
+        jobs = tenant['jobs']
+        if job_types:
+            jobs = [job for job in jobs if job['jobType'] in job_types]
+        if states:
+            jobs = [job for job in jobs if (job.get('latestRun') or {}).get('state') in states]
+        yield {
+            "name": tenant['name'],
+            "jobs": jobs,
+            "usedVms": tenant['usedVms'],
+            "storage": tenant['storage']
+        }
+
+def collect_nakivo_data(store=None, timings=None):
+    return list(iter_nakivo_data(store, timings=timings))
+
+def render_report(tenants_data, pdf_path=None, executor=None, timings=None):
+    return NakivoPDFGenerator.generate_pdf(tenants_data, pdf_path, executor, timings)
+
+def generate_nakivo_report(pdf_path=None):
+    return render_report(collect_nakivo_data(), pdf_path)
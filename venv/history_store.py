@@ -0,0 +1,192 @@
+import json
+import math
+import sqlite3
+import threading
+import time
+
+# Runs are re-requested with a little overlap past the watermark so a run that
+# finished while the previous sync was in flight is not missed; duplicates are
+# dropped by the runs primary key.
+SYNC_OVERLAP_MINUTES = 5
+MAX_PERIOD_MINUTES = 1440
+# A delta sync only returns jobs that processed something in its window, so
+# deleted jobs are only detected by a full MAX_PERIOD_MINUTES sync, which each
+# tenant gets at least this often.
+FULL_SYNC_INTERVAL_MINUTES = 1440
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenants (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    used_vms INTEGER
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    tenant_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    job_type TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    vms TEXT NOT NULL,
+    last_seen REAL,
+    removed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, name)
+);
+CREATE TABLE IF NOT EXISTS vms (
+    tenant_id TEXT NOT NULL,
+    job_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (tenant_id, job_name, name)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    tenant_id TEXT NOT NULL,
+    job_name TEXT NOT NULL,
+    vm_name TEXT NOT NULL,
+    start_date INTEGER NOT NULL,
+    finish_date INTEGER,
+    state TEXT,
+    data_transferred INTEGER,
+    data_transferred_uncompressed INTEGER,
+    schedule_name TEXT,
+    retention_info TEXT,
+    PRIMARY KEY (tenant_id, job_name, vm_name, start_date)
+);
+CREATE INDEX IF NOT EXISTS runs_by_job ON runs (tenant_id, job_name, start_date);
+CREATE INDEX IF NOT EXISTS runs_by_state ON runs (state, finish_date);
+CREATE TABLE IF NOT EXISTS sync_state (
+    tenant_id TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL,
+    full_synced_at REAL
+);
+"""
+
+
+class HistoryStore:
+    """SQLite history of tenants, jobs, VMs and runs collected from Nakivo.
+
+    Each tenant has a sync watermark, so collection only asks Nakivo for runs
+    since the previous sync. Dates are stored as Nakivo returns them (epoch
+    milliseconds). Connections are per thread; the collector writes from its
+    worker pool.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            # Databases created before jobs tracked removal lack these columns.
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "last_seen" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN last_seen REAL")
+            if "removed" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN removed INTEGER NOT NULL DEFAULT 0")
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(sync_state)")]
+            if "full_synced_at" not in columns:
+                conn.execute("ALTER TABLE sync_state ADD COLUMN full_synced_at REAL")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def sync_period_minutes(self, tenant_id, now=None):
+        now = time.time() if now is None else now
+        row = self._connection().execute(
+            "SELECT synced_at, full_synced_at FROM sync_state WHERE tenant_id = ?", (tenant_id,)).fetchone()
+        if row is None or row["full_synced_at"] is None:
+            return MAX_PERIOD_MINUTES
+        if now - row["full_synced_at"] >= FULL_SYNC_INTERVAL_MINUTES * 60:
+            return MAX_PERIOD_MINUTES
+        minutes = math.ceil((now - row["synced_at"]) / 60) + SYNC_OVERLAP_MINUTES
+        return min(minutes, MAX_PERIOD_MINUTES)
+
+    def record_tenant(self, tenant):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO tenants (id, name, used_vms) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET name = excluded.name, used_vms = excluded.used_vms",
+                (tenant['uuid'], tenant['name'], tenant['usedVms']))
+
+    def record_jobs(self, tenant_id, job_info_list, synced_at, period_minutes=MAX_PERIOD_MINUTES):
+        """Store a getProcessedVms jobInfoList and move the watermark to ``synced_at``.
+
+        Only a full sync (``period_minutes`` of MAX_PERIOD_MINUTES) lists every
+        job of the tenant; jobs missing from it have been deleted on the
+        appliance and are marked removed. A shorter delta window says nothing
+        about the jobs it leaves out.
+        """
+        full = period_minutes >= MAX_PERIOD_MINUTES
+        with self._connection() as conn:
+            if full:
+                conn.execute("UPDATE jobs SET removed = 1 WHERE tenant_id = ?", (tenant_id,))
+            for position, job_info in enumerate(job_info_list):
+                vm_names = [vm['name'] for vm in job_info['vmInfoList']]
+                conn.execute(
+                    "INSERT INTO jobs (tenant_id, name, job_type, position, vms, last_seen, removed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 0) "
+                    "ON CONFLICT (tenant_id, name) DO UPDATE SET job_type = excluded.job_type, "
+                    "position = excluded.position, vms = excluded.vms, last_seen = excluded.last_seen, "
+                    "removed = 0",
+                    (tenant_id, job_info['name'], job_info['jobType'], position, json.dumps(vm_names), synced_at))
+                for vm_info in job_info['vmInfoList']:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO vms (tenant_id, job_name, name) VALUES (?, ?, ?)",
+                        (tenant_id, job_info['name'], vm_info['name']))
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO runs (tenant_id, job_name, vm_name, start_date, finish_date, "
+                        "state, data_transferred, data_transferred_uncompressed, schedule_name, retention_info) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(tenant_id, job_info['name'], vm_info['name'], run['startDate'], run['finishDate'],
+                          run['state'], run['dataTransferred'], run['dataTransferredUncompressed'],
+                          run['scheduleName'], run.get('retentionInfo', 'N/A'))
+                         for run in vm_info.get('runInfoList', [])])
+            conn.execute(
+                "INSERT INTO sync_state (tenant_id, synced_at, full_synced_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (tenant_id) DO UPDATE SET synced_at = excluded.synced_at, "
+                "full_synced_at = COALESCE(excluded.full_synced_at, sync_state.full_synced_at)",
+                (tenant_id, synced_at, synced_at if full else None))
+
+    def latest_jobs(self, tenant_id):
+        """Jobs of a tenant with their most recent run, shaped like collected jobs."""
+        rows = self._connection().execute(
+            "SELECT j.name, j.job_type, j.vms, r.state, r.start_date, r.finish_date, r.data_transferred, "
+            "r.data_transferred_uncompressed, r.schedule_name, r.retention_info "
+            "FROM jobs j LEFT JOIN runs r ON r.rowid = ("
+            "    SELECT rowid FROM runs WHERE tenant_id = j.tenant_id AND job_name = j.name "
+            "    ORDER BY start_date DESC LIMIT 1) "
+            "WHERE j.tenant_id = ? AND j.removed = 0 ORDER BY j.position, j.name", (tenant_id,)).fetchall()
+        jobs = []
+        for row in rows:
+            job = {
+                "name": row["name"],
+                "jobType": row["job_type"],
+                "latestRun": None,
+                "retentionInfo": "N/A",
+                "vms": json.loads(row["vms"])
+            }
+            if row["start_date"] is not None:
+                job["latestRun"] = {
+                    "state": row["state"],
+                    "startDate": row["start_date"],
+                    "finishDate": row["finish_date"],
+                    "dataTransferred": row["data_transferred"],
+                    "dataTransferredUncompressed": row["data_transferred_uncompressed"],
+                    "scheduleName": row["schedule_name"]
+                }
+                job["retentionInfo"] = row["retention_info"]
+            jobs.append(job)
+        return jobs
+
+    def failed_runs(self, since, until=None):
+        """Failed runs that finished in ``[since, until)``, newest first (epoch ms)."""
+        until = time.time() * 1000 if until is None else until
+        rows = self._connection().execute(
+            "SELECT t.name AS tenant_name, r.tenant_id, r.job_name, r.vm_name, r.start_date, r.finish_date "
+            "FROM runs r LEFT JOIN tenants t ON t.id = r.tenant_id "
+            "JOIN jobs j ON j.tenant_id = r.tenant_id AND j.name = r.job_name AND j.removed = 0 "
+            "WHERE r.state = 'FAILED' AND r.finish_date >= ? AND r.finish_date < ? "
+            "ORDER BY r.finish_date DESC", (since, until)).fetchall()
+        return [dict(row) for row in rows]
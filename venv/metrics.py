@@ -0,0 +1,156 @@
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}  # labels -> (bucket counts, sum, count)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labelnames, key, [("le", repr(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All registered metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+RPC_DURATION = REGISTRY.register(Histogram(
+    "nakivo_rpc_duration_seconds", "Time until a Nakivo RPC was answered.", ("action", "method")))
+RPC_REQUESTS = REGISTRY.register(Counter(
+    "nakivo_rpc_requests_total", "Nakivo RPCs sent.", ("action", "method")))
+RPC_ERRORS = REGISTRY.register(Counter(
+    "nakivo_rpc_errors_total", "Nakivo RPCs that failed or returned an exception.", ("action", "method")))
+REPORT_STAGE_DURATION = REGISTRY.register(Histogram(
+    "nakivo_report_stage_duration_seconds", "Time spent per report generation stage.", ("stage",)))
+REPORT_WORKER_DURATION = REGISTRY.register(Histogram(
+    "nakivo_report_worker_seconds", "Time per report stage summed across parallel render workers.", ("stage",)))
+REPORTS = REGISTRY.register(Counter(
+    "nakivo_reports_total", "Reports generated.", ()))
+
+
+class ReportTimings:
+    """Per-report breakdown of time spent in each generation stage.
+
+    ``stages`` holds wall-clock time; repeated stages are summed. Work that
+    ran in parallel workers is added with ``add_worker`` instead and kept in
+    ``worker_stages``, since its sum can exceed the wall-clock time of the
+    report. ``observe`` records the totals in REPORT_STAGE_DURATION and
+    REPORT_WORKER_DURATION once the report is finished. Timings are read by
+    status requests while the report is still being built, so all access
+    goes through a lock.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.worker_stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_worker(self, name, seconds):
+        with self._lock:
+            self.worker_stages[name] = self.worker_stages.get(name, 0.0) + seconds
+
+    def observe(self):
+        with self._lock:
+            stages = dict(self.stages)
+            worker_stages = dict(self.worker_stages)
+        for name, seconds in stages.items():
+            REPORT_STAGE_DURATION.observe(seconds, stage=name)
+        for name, seconds in worker_stages.items():
+            REPORT_WORKER_DURATION.observe(seconds, stage=name)
+        REPORTS.inc()
+
+    def as_dict(self):
+        """Wall-clock stages, plus worker sums as ``<stage>_worker_seconds``."""
+        with self._lock:
+            timings = {name: round(seconds, 4) for name, seconds in self.stages.items()}
+            timings.update({f"{name}_worker_seconds": round(seconds, 4)
+                            for name, seconds in self.worker_stages.items()})
+        return timings
+
+    def server_timing(self):
+        """Value for a Server-Timing response header (wall-clock stages only)."""
+        with self._lock:
+            stages = list(self.stages.items())
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages)
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+FILE_PREFIX = "nakivo_report_"
+SWEEP_INTERVAL = 60
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ReportCache:
+    """Rendered PDF reports on disk, keyed by time bucket.
+
+    Each entry remembers the digest of the data it was rendered from, which
+    doubles as the ETag. Entries expire after ``ttl`` seconds and the oldest
+    ones are removed once ``max_entries`` or ``max_bytes`` is exceeded.
+    Report files in ``directory`` that no entry references (failed renders,
+    earlier processes) are removed once they are older than ``ttl``.
+    """
+
+    def __init__(self, directory, ttl=300, max_entries=20, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (pdf_path, etag, created)
+        self._flights = {}
+        self._reserved = set()  # paths handed out by new_path, not yet put
+        self._last_sweep = 0
+        with self._lock:
+            self._sweep_files()
+
+    @staticmethod
+    def digest(tenants_data):
+        payload = json.dumps(tenants_data, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def time_bucket(self):
+        return int(time.time() // self.ttl)
+
+    def new_path(self):
+        fd, pdf_path = tempfile.mkstemp(prefix=FILE_PREFIX, suffix=".pdf", dir=self.directory)
+        os.close(fd)
+        with self._lock:
+            self._reserved.add(pdf_path)
+        return pdf_path
+
+    def discard(self, pdf_path):
+        """Remove a file from ``new_path`` that will not be put, e.g. after a failed render."""
+        with self._lock:
+            self._reserved.discard(pdf_path)
+        try:
+            os.remove(pdf_path)
+        except OSError:
+            pass
+
+    def get(self, key):
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return entry[0], entry[1]
+
+    def reuse(self, key, etag):
+        """Point ``key`` at an existing render of the same data, if any."""
+        with self._lock:
+            self._evict()
+            for pdf_path, entry_etag, _ in self._entries.values():
+                if entry_etag == etag:
+                    self._entries[key] = (pdf_path, etag, time.time())
+                    # Keep the file's age in step with the entry for sweeps.
+                    try:
+                        os.utime(pdf_path)
+                    except OSError:
+                        pass
+                    return pdf_path
+        return None
+
+    def put(self, key, pdf_path, etag):
+        with self._lock:
+            self._reserved.discard(pdf_path)
+            self._entries[key] = (pdf_path, etag, time.time())
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def get_or_create(self, key, create):
+        """Return ``(pdf_path, etag)`` for ``key``, building it at most once.
+
+        ``create`` must return ``(pdf_path, etag)``. Concurrent callers asking
+        for the same missing key wait for the first caller's result instead
+        of running ``create`` themselves.
+        """
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0], entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = create()
+            self.put(key, *flight.result)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _evict(self):
+        now = time.time()
+        for key, (_, _, created) in list(self._entries.items()):
+            if now - created > self.ttl or not os.path.exists(self._entries[key][0]):
+                self._remove(key)
+
+        total = sum(self._size(pdf_path) for pdf_path in set(e[0] for e in self._entries.values()))
+        # The newest entry is always kept so a freshly rendered report is
+        # never removed before it has been served.
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or total > self.max_bytes):
+            key = next(iter(self._entries))
+            pdf_path = self._entries[key][0]
+            size = self._size(pdf_path)
+            self._remove(key)
+            if not any(e[0] == pdf_path for e in self._entries.values()):
+                total -= size
+
+        if now - self._last_sweep > SWEEP_INTERVAL:
+            self._sweep_files()
+
+    def _sweep_files(self):
+        self._last_sweep = time.time()
+        referenced = set(e[0] for e in self._entries.values()) | self._reserved
+        for name in os.listdir(self.directory):
+            pdf_path = os.path.join(self.directory, name)
+            if not name.startswith(FILE_PREFIX) or pdf_path in referenced:
+                continue
+            try:
+                if self._last_sweep - os.path.getmtime(pdf_path) > self.ttl:
+                    os.remove(pdf_path)
+            except OSError:
+                pass
+
+    def _remove(self, key):
+        pdf_path = self._entries.pop(key)[0]
+        # Several buckets can point at the same file when the data did not
+        # change between them; only delete it once nothing references it.
+        if not any(e[0] == pdf_path for e in self._entries.values()):
+            try:
+                os.remove(pdf_path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _size(pdf_path):
+        try:
+            return os.path.getsize(pdf_path)
+        except OSError:
+            return 0
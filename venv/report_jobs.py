@@ -0,0 +1,132 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import metrics
+
+QUEUED = "queued"
+COLLECTING = "collecting"
+RENDERING = "rendering"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class ReportJob:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.state = QUEUED
+        self.error = None
+        self.pdf_path = None
+        self.etag = None
+        self.last_seen = time.time()
+        self.future = None
+        self.cancel_requested = False
+        self.timings = metrics.ReportTimings()
+
+    def set_phase(self, phase):
+        self.state = phase
+
+    def check_cancelled(self):
+        # A job that nobody polls any more stops here instead of building a
+        # report nobody will download. Only call this outside work that is
+        # shared with other requests (such as a single-flight build), so the
+        # cancellation never reaches them.
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    def to_dict(self):
+        return {"id": self.id, "state": self.state, "error": self.error, "timings": self.timings.as_dict()}
+
+
+class ReportJobManager:
+    """Runs report jobs in the background and tracks their progress.
+
+    Jobs are driven by a small thread pool (network collection is I/O bound);
+    CPU-bound rendering work is submitted to the process pool returned by
+    ``render_pool``. At most ``max_pending`` jobs may be queued or running,
+    a submit for a key that already has an unfinished job returns that job,
+    and jobs that have not been polled for ``abandon_after`` seconds are
+    cancelled.
+    """
+
+    def __init__(self, max_pending=8, max_running=2, render_workers=2, abandon_after=300):
+        self.max_pending = max_pending
+        self.abandon_after = abandon_after
+        self.render_workers = render_workers
+
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._runner = ThreadPoolExecutor(max_workers=max_running)
+        self._renderer = None
+
+    def submit(self, key, run):
+        """Queue ``run(job)`` under ``key``; it must return ``(pdf_path, etag)``."""
+        with self._lock:
+            self._sweep()
+            pending = [job for job in self._jobs.values() if job.state not in FINISHED_STATES]
+            for job in pending:
+                if job.key == key and not job.cancel_requested:
+                    job.last_seen = time.time()
+                    return job
+            if len(pending) >= self.max_pending:
+                raise QueueFull()
+
+            job = ReportJob(key)
+            self._jobs[job.id] = job
+            job.future = self._runner.submit(self._run, job, run)
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._sweep()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.last_seen = time.time()
+            return job
+
+    def render_pool(self):
+        with self._lock:
+            if self._renderer is None:
+                # spawn rather than fork: the parent is a threaded web server.
+                self._renderer = ProcessPoolExecutor(max_workers=self.render_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._renderer
+
+    def _run(self, job, run):
+        try:
+            job.check_cancelled()
+            job.set_phase(COLLECTING)
+            job.pdf_path, job.etag = run(job)
+            job.state = DONE
+        except JobCancelled:
+            job.state = CANCELLED
+        except Exception as e:
+            print(f"Report job {job.id} failed: {e}")
+            job.error = str(e)
+            job.state = FAILED
+
+    def _sweep(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if now - job.last_seen <= self.abandon_after:
+                continue
+            if job.state in FINISHED_STATES:
+                del self._jobs[job_id]
+            elif job.future.cancel():
+                job.state = CANCELLED
+            else:
+                job.cancel_requested = True
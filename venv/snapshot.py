@@ -0,0 +1,100 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+# Failed refreshes are retried after RETRY_MIN seconds, doubling up to the
+# normal refresh interval.
+RETRY_MIN = 5
+
+
+class Snapshot:
+    def __init__(self, version, collected_at=None, data=None):
+        self.version = version
+        self.collected_at = collected_at
+        self.data = data or {}
+
+
+class DataSnapshot:
+    """Latest collected data, refreshed on a background schedule.
+
+    ``load`` is called every ``interval`` seconds and returns a dict of
+    everything the pages need, including any precomputed aggregates. A failed
+    load is retried sooner, backing off from RETRY_MIN seconds. Readers
+    always get the current snapshot straight away, even while a refresh is
+    running. The version only changes when the loaded data changes, so it can
+    be used as an ETag.
+    """
+
+    def __init__(self, load, interval=300):
+        self._load = load
+        self.interval = interval
+        self._boot_id = uuid.uuid4().hex[:8]
+        self._generation = 0
+        self._digest = None
+        self._snapshot = Snapshot(self._version())
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self._retry_after = 0
+        self.refreshing = False
+
+    def current(self):
+        self._ensure_started()
+        snapshot = self._snapshot
+        # No data yet, or past its refresh interval (e.g. refreshes have been
+        # failing): serve it anyway and ask the refresher to run again now,
+        # unless a refresh is already running or a failed one is backing off.
+        missing = snapshot.collected_at is None
+        stale = not missing and time.time() - snapshot.collected_at > self.interval * 2
+        if (missing or stale) and not self.refreshing and time.time() >= self._retry_after:
+            self._wake.set()
+        return snapshot
+
+    def refresh(self):
+        """Load a new snapshot; returns False if loading failed."""
+        with self._lock:
+            if self.refreshing:
+                return True
+            self.refreshing = True
+        try:
+            data = self._load()
+            digest = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+            if digest != self._digest:
+                self._digest = digest
+                self._generation += 1
+            self._snapshot = Snapshot(self._version(), time.time(), data)
+            return True
+        except Exception as e:
+            print(f"Snapshot refresh failed: {e}")
+            return False
+        finally:
+            self.refreshing = False
+
+    def _version(self):
+        return f"{self._boot_id}-{self._generation}"
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="data-snapshot", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            if self.refresh():
+                self._failures = 0
+                delay = self.interval
+            else:
+                self._failures += 1
+                delay = min(RETRY_MIN * 2 ** (self._failures - 1), self.interval)
+            self._retry_after = time.time() + delay if self._failures else 0
+            # Wakes from reads that raced with this refresh are answered by
+            # it; they must not cut the wait (or a failure's backoff) short.
+            self._wake.clear()
+            self._wake.wait(delay)